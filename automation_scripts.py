@@ -5,18 +5,178 @@ Simula integraciones con Zendesk, Slack y automatizaciones básicas
 
 import json
 import logging
+import queue
+import threading
+import time
 from datetime import datetime
+from functools import lru_cache
+from typing import NamedTuple, Optional
 import requests
 
+try:
+    import orjson
+except ImportError:  # sin orjson se usa el módulo json estándar
+    orjson = None
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Máximo de mensajes agrupados en un solo POST al webhook de Slack
+SLACK_BATCH_SIZE = 10
+
+# Marca que detiene el worker de Slack
+_STOP = object()
+
+# Asignación por categoría (tiene precedencia sobre la prioridad)
+_CATEGORY_MAP = {
+    'hardware': 'Agente1',  # Especialista en hardware/red
+    'red': 'Agente1',
+    'software': 'Agente2',  # Especialista en software
+    'email': 'Agente2',
+}
+
+# Asignación por prioridad; el resto va al agente general (Agente4)
+_PRIORITY_MAP = {
+    'crítica': 'Agente3',  # Especialista en urgencias
+}
+
+
+@lru_cache(maxsize=64)
+def _resolve_agent(categoria, prioridad):
+    """Resuelve el agente para una categoría y prioridad ya en minúsculas"""
+    return _CATEGORY_MAP.get(categoria) or _PRIORITY_MAP.get(prioridad, 'Agente4')
+
+
+class AutomationEvent(NamedTuple):
+    """Entrada del log de automatizaciones"""
+    action: str
+    timestamp: str
+    extra: dict
+    status: Optional[str] = None
+    
+    def to_dict(self):
+        """Devuelve la entrada como diccionario plano; status se omite si no tiene"""
+        entry = {'timestamp': self.timestamp, 'action': self.action, **self.extra}
+        if self.status is not None:
+            entry['status'] = self.status
+        return entry
+
 
 class SupportAutomation:
     """Clase para automatización de procesos de soporte"""
     
-    def __init__(self):
+    def __init__(self, slack_webhook_url=None):
+        """
+        Inicializa las automatizaciones.
+        
+        Args:
+            slack_webhook_url: URL del webhook de Slack; sin ella las notificaciones solo se registran
+        """
         self.automation_log = []
+        self._ts_cache = (0, '')
+        self.slack_webhook_url = slack_webhook_url
+        self._slack_q = queue.Queue()
+        self._slack_thread = None
+        self._slack_lock = threading.Lock()
+    
+    def _now_iso(self):
+        """Devuelve la hora actual en ISO 8601, reutilizando el valor dentro del mismo segundo"""
+        segundo = int(time.time())
+        if segundo != self._ts_cache[0]:
+            self._ts_cache = (segundo, datetime.fromtimestamp(segundo).isoformat(timespec='seconds'))
+        return self._ts_cache[1]
+    
+    def _ensure_slack_worker(self):
+        """Inicia el worker de Slack la primera vez que se encola una notificación"""
+        with self._slack_lock:
+            if self._slack_thread is None:
+                self._slack_thread = threading.Thread(target=self._slack_worker, daemon=True)
+                self._slack_thread.start()
+    
+    def _slack_worker(self):
+        """Envía en segundo plano las notificaciones encoladas, agrupadas por lote"""
+        while True:
+            item = self._slack_q.get()
+            if item is _STOP:
+                self._slack_q.task_done()
+                return
+            
+            batch = [item]
+            stop = False
+            try:
+                while len(batch) < SLACK_BATCH_SIZE:
+                    item = self._slack_q.get(timeout=0.05)
+                    if item is _STOP:
+                        stop = True
+                        break
+                    batch.append(item)
+            except queue.Empty:
+                pass
+            
+            try:
+                self._send_slack_batch(batch)
+            finally:
+                for _ in range(len(batch) + stop):
+                    self._slack_q.task_done()
+            
+            if stop:
+                return
+    
+    def _send_slack_batch(self, batch):
+        """Envía un lote de notificaciones, un POST por canal, y registra el resultado"""
+        por_canal = {}
+        for notification in batch:
+            por_canal.setdefault(notification.extra['channel'], []).append(notification.extra['message'])
+        
+        for channel, messages in por_canal.items():
+            if not self.slack_webhook_url:
+                # Sin webhook no se envía nada: solo queda registrado
+                logger.info(f"{len(messages)} notificación(es) para {channel} registrada(s) sin enviar (sin webhook)")
+                self.automation_log.append(AutomationEvent(
+                    action='slack_logged',
+                    timestamp=self._now_iso(),
+                    status='logged_only',
+                    extra={'channel': channel, 'messages': len(messages)}
+                ))
+                continue
+            
+            try:
+                response = requests.post(
+                    self.slack_webhook_url,
+                    json={'channel': channel, 'text': '\n'.join(messages)},
+                    timeout=10
+                )
+                response.raise_for_status()
+            except Exception as e:
+                logger.error(f"Error al enviar notificaciones a Slack ({channel}): {str(e)}")
+                outcome = AutomationEvent(
+                    action='slack_failed',
+                    timestamp=self._now_iso(),
+                    status='failed',
+                    extra={'channel': channel, 'messages': len(messages), 'error': str(e)}
+                )
+            else:
+                logger.info(f"{len(messages)} notificación(es) enviada(s) a {channel}")
+                outcome = AutomationEvent(
+                    action='slack_sent',
+                    timestamp=self._now_iso(),
+                    status='sent',
+                    extra={'channel': channel, 'messages': len(messages)}
+                )
+            
+            self.automation_log.append(outcome)
+    
+    def flush_notifications(self):
+        """Espera a que se envíen todas las notificaciones encoladas"""
+        self._slack_q.join()
+    
+    def close(self):
+        """Envía las notificaciones pendientes y detiene el worker de Slack"""
+        with self._slack_lock:
+            thread, self._slack_thread = self._slack_thread, None
+        if thread is not None:
+            self._slack_q.put(_STOP)
+            thread.join()
     
     def simulate_zendesk_integration(self, ticket_data):
         """
@@ -26,39 +186,44 @@ class SupportAutomation:
         logger.info("Simulando integración con Zendesk API...")
         
         # Simulación de llamada a API
-        automation = {
-            'timestamp': datetime.now().isoformat(),
-            'action': 'create_ticket',
-            'source': 'zendesk',
-            'ticket_id': ticket_data.get('ticket_id'),
-            'status': 'success',
-            'message': 'Ticket creado en Zendesk'
-        }
+        automation = AutomationEvent(
+            action='create_ticket',
+            timestamp=self._now_iso(),
+            status='success',
+            extra={
+                'source': 'zendesk',
+                'ticket_id': ticket_data.get('ticket_id'),
+                'message': 'Ticket creado en Zendesk'
+            }
+        )
         
         self.automation_log.append(automation)
         logger.info(f"Ticket {ticket_data.get('ticket_id')} procesado")
         
-        return automation
+        return automation.to_dict()
     
     def simulate_slack_notification(self, message, channel='#soporte-ti'):
         """
         Simula notificación a Slack
-        En producción, usaría webhook de Slack
+        La notificación se encola y se envía en segundo plano vía webhook de Slack
         """
         logger.info(f"Simulando notificación a Slack: {channel}")
         
-        notification = {
-            'timestamp': datetime.now().isoformat(),
-            'action': 'slack_notification',
-            'channel': channel,
-            'message': message,
-            'status': 'sent'
-        }
+        notification = AutomationEvent(
+            action='slack_notification',
+            timestamp=self._now_iso(),
+            status='queued',
+            extra={
+                'channel': channel,
+                'message': message
+            }
+        )
         
         self.automation_log.append(notification)
-        logger.info(f"Notificación enviada a {channel}")
+        self._ensure_slack_worker()
+        self._slack_q.put(notification)
         
-        return notification
+        return notification.to_dict()
     
     def auto_assign_ticket(self, ticket_data):
         """
@@ -71,27 +236,22 @@ class SupportAutomation:
         prioridad = ticket_data.get('prioridad', '').lower()
         
         # Lógica de asignación automática
-        if 'hardware' in categoria or 'red' in categoria:
-            agente = 'Agente1'  # Especialista en hardware/red
-        elif 'software' in categoria or 'email' in categoria:
-            agente = 'Agente2'  # Especialista en software
-        elif prioridad == 'crítica':
-            agente = 'Agente3'  # Especialista en urgencias
-        else:
-            agente = 'Agente4'  # Agente general
+        agente = _resolve_agent(categoria, prioridad)
         
-        automation = {
-            'timestamp': datetime.now().isoformat(),
-            'action': 'auto_assign',
-            'ticket_id': ticket_data.get('ticket_id'),
-            'assigned_to': agente,
-            'reason': f"Asignado automáticamente por categoría: {categoria}"
-        }
+        automation = AutomationEvent(
+            action='auto_assign',
+            timestamp=self._now_iso(),
+            extra={
+                'ticket_id': ticket_data.get('ticket_id'),
+                'assigned_to': agente,
+                'reason': f"Asignado automáticamente por categoría: {categoria}"
+            }
+        )
         
         self.automation_log.append(automation)
         logger.info(f"Ticket asignado automáticamente a {agente}")
         
-        return automation
+        return automation.to_dict()
     
     def generate_weekly_report(self):
         """
@@ -100,18 +260,20 @@ class SupportAutomation:
         """
         logger.info("Generando reporte semanal automatizado...")
         
-        report = {
-            'timestamp': datetime.now().isoformat(),
-            'action': 'weekly_report',
-            'period': 'semana_actual',
-            'status': 'generated',
-            'delivery': ['email', 'slack']
-        }
+        report = AutomationEvent(
+            action='weekly_report',
+            timestamp=self._now_iso(),
+            status='generated',
+            extra={
+                'period': 'semana_actual',
+                'delivery': ['email', 'slack']
+            }
+        )
         
         self.automation_log.append(report)
         logger.info("Reporte semanal generado y enviado")
         
-        return report
+        return report.to_dict()
     
     def escalate_old_tickets(self, days_threshold=3):
         """
@@ -119,23 +281,35 @@ class SupportAutomation:
         """
         logger.info(f"Buscando tickets con más de {days_threshold} días...")
         
-        escalation = {
-            'timestamp': datetime.now().isoformat(),
-            'action': 'escalate_tickets',
-            'threshold_days': days_threshold,
-            'tickets_found': 5,  # Simulado
-            'status': 'escalated'
-        }
+        escalation = AutomationEvent(
+            action='escalate_tickets',
+            timestamp=self._now_iso(),
+            status='escalated',
+            extra={
+                'threshold_days': days_threshold,
+                'tickets_found': 5  # Simulado
+            }
+        )
         
         self.automation_log.append(escalation)
-        logger.info(f"Tickets escalados: {escalation['tickets_found']}")
+        logger.info(f"Tickets escalados: {escalation.extra['tickets_found']}")
         
-        return escalation
+        return escalation.to_dict()
     
     def export_automation_log(self, output_path='automation_log.json'):
         """Exporta log de automatizaciones"""
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(self.automation_log, f, indent=2, ensure_ascii=False, default=str)
+        entries = [event.to_dict() for event in self.automation_log]
+        
+        if orjson is not None:
+            with open(output_path, 'wb') as f:
+                f.write(orjson.dumps(
+                    entries,
+                    option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS,
+                    default=str
+                ))
+        else:
+            with open(output_path, 'w', encoding='utf-8') as f:
+                json.dump(entries, f, indent=2, ensure_ascii=False, default=str)
         
         logger.info(f"Log de automatizaciones exportado a: {output_path}")
         return output_path
@@ -169,6 +343,9 @@ def main():
     # Escalar tickets antiguos
     automation.escalate_old_tickets()
     
+    # Enviar notificaciones pendientes y detener el worker
+    automation.close()
+    
     # Exportar log
     automation.export_automation_log()
     
@@ -176,7 +353,7 @@ def main():
     print("AUTOMATIZACIONES EJECUTADAS")
     print("=" * 60)
     for log_entry in automation.automation_log:
-        print(f"\n{log_entry['action']}: {log_entry.get('status', 'completed')}")
+        print(f"\n{log_entry.action}: {log_entry.status or 'completed'}")
 
 
 if __name__ == "__main__":
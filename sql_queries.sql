@@ -1,5 +1,6 @@
 -- Consultas SQL para análisis de soporte TI
 -- Compatible con SQL ANSI y PL/SQL básico
+-- es_resuelto es una columna generada: 1 si estado es 'Resuelto' o 'Cerrado', 0 en otro caso
 
 -- 1. Tickets abiertos por categoría
 SELECT 
@@ -7,7 +8,7 @@ SELECT
     COUNT(*) as tickets_abiertos,
     AVG(tiempo_resolucion_horas) as tiempo_promedio_horas
 FROM tickets
-WHERE estado IN ('Abierto', 'En Progreso')
+WHERE es_resuelto = 0
 GROUP BY categoria
 ORDER BY tickets_abiertos DESC;
 
@@ -15,7 +16,7 @@ ORDER BY tickets_abiertos DESC;
 SELECT 
     agente_asignado,
     COUNT(*) as total_tickets,
-    COUNT(CASE WHEN estado IN ('Resuelto', 'Cerrado') THEN 1 END) as tickets_resueltos,
+    SUM(es_resuelto) as tickets_resueltos,
     ROUND(AVG(tiempo_resolucion_horas), 2) as tiempo_promedio_horas,
     ROUND(AVG(satisfaccion_cliente), 2) as satisfaccion_promedio
 FROM tickets
@@ -44,8 +45,8 @@ ORDER BY
 SELECT 
     strftime('%Y-%W', fecha_creacion) as semana,
     COUNT(*) as tickets_creados,
-    COUNT(CASE WHEN estado IN ('Resuelto', 'Cerrado') THEN 1 END) as tickets_resueltos,
-    ROUND(COUNT(CASE WHEN estado IN ('Resuelto', 'Cerrado') THEN 1 END) * 100.0 / COUNT(*), 2) as tasa_resolucion
+    SUM(es_resuelto) as tickets_resueltos,
+    ROUND(SUM(es_resuelto) * 100.0 / COUNT(*), 2) as tasa_resolucion
 FROM tickets
 GROUP BY semana
 ORDER BY semana DESC
@@ -61,7 +62,7 @@ SELECT
     fecha_creacion
 FROM tickets
 WHERE tiempo_resolucion_horas > 24
-    AND estado IN ('Resuelto', 'Cerrado')
+    AND es_resuelto = 1
 ORDER BY tiempo_resolucion_horas DESC;
 
 -- 6. Satisfacción por categoría
@@ -94,7 +95,7 @@ SELECT
     agente_asignado,
     ROUND(julianday('now') - julianday(fecha_creacion), 2) as dias_pendiente
 FROM tickets
-WHERE estado IN ('Abierto', 'En Progreso')
+WHERE es_resuelto = 0
     AND julianday('now') - julianday(fecha_creacion) > 3
 ORDER BY dias_pendiente DESC;
 
@@ -102,7 +103,7 @@ ORDER BY dias_pendiente DESC;
 SELECT 
     DATE(fecha_creacion) as fecha,
     COUNT(*) as tickets_creados,
-    COUNT(CASE WHEN estado IN ('Resuelto', 'Cerrado') THEN 1 END) as tickets_resueltos,
+    SUM(es_resuelto) as tickets_resueltos,
     ROUND(AVG(tiempo_resolucion_horas), 2) as tiempo_promedio_horas
 FROM tickets
 WHERE fecha_creacion >= DATE('now', '-7 days')
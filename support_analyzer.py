@@ -3,16 +3,44 @@ Analizador de tickets de soporte TI
 Análisis de métricas de servicio y automatización de procesos
 """
 
-import pandas as pd
-import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+import os
+from pathlib import Path
+import secrets
 import sqlite3
-import json
 import logging
+import orjson
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# es_resuelto se deriva siempre de estado; un estado NULL cuenta como no resuelto
+_ES_RESUELTO_DEF = (
+    "INTEGER GENERATED ALWAYS AS (IFNULL(estado, '') IN ('Resuelto', 'Cerrado')) VIRTUAL"
+)
+
+# Filas por llamada a executemany al insertar tickets
+INSERT_BATCH_SIZE = 1000
+
+_SEP = "=" * 60
+_REPORT_HEADER = f"\n{_SEP}\nREPORTE DE MÉTRICAS DE SOPORTE TI\n{_SEP}"
+
+# Parte fija del reporte resumen; los valores se completan con format_map(metrics)
+_REPORT_TEMPLATE = (
+    _REPORT_HEADER
+    + "\n\nMETRICAS GENERALES"
+    "\n  Total de tickets: {total_tickets}"
+    "\n  Tickets resueltos: {tickets_resueltos}"
+    "\n  Tickets abiertos: {tickets_abiertos}"
+    "\n  Tasa de resolucion: {tasa_resolucion}%"
+    "\n\nTIEMPOS DE RESOLUCION"
+    "\n  Tiempo promedio: {tiempo_promedio_resolucion_horas:.2f} horas"
+    "\n  SLA 24h: {sla_24h:.2f}%"
+    "\n\nSATISFACCION"
+    "\n  Satisfaccion promedio: {satisfaccion_promedio:.2f}/5"
+)
+
 
 class SupportAnalyzer:
     """Analizador de tickets de soporte y métricas de servicio"""
@@ -31,7 +59,11 @@ class SupportAnalyzer:
     def connect_db(self):
         """Conecta a la base de datos SQLite"""
         try:
-            self.conn = sqlite3.connect(self.db_path)
+            # Modo autocommit: las transacciones se abren explícitamente con BEGIN
+            self.conn = sqlite3.connect(self.db_path, isolation_level=None)
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+            self.conn.execute('PRAGMA temp_store=MEMORY')
             logger.info(f"Conectado a base de datos: {self.db_path}")
             return self.conn
         except Exception as e:
@@ -42,139 +74,205 @@ class SupportAnalyzer:
         """Crea las tablas necesarias en la base de datos"""
         cursor = self.conn.cursor()
         
-        # Tabla de tickets
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS tickets (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                ticket_id TEXT UNIQUE,
-                fecha_creacion DATE,
-                fecha_resolucion DATE,
-                categoria TEXT,
-                prioridad TEXT,
-                estado TEXT,
-                agente_asignado TEXT,
-                tiempo_resolucion_horas REAL,
-                canal TEXT,
-                satisfaccion_cliente INTEGER,
-                descripcion TEXT
+        # es_resuelto es una columna generada (SQLite 3.31+)
+        if sqlite3.sqlite_version_info < (3, 31, 0):
+            raise RuntimeError(
+                f"Se requiere SQLite 3.31 o superior; versión disponible: {sqlite3.sqlite_version}"
             )
-        ''')
         
-        # Tabla de métricas diarias
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS metricas_diarias (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                fecha DATE,
-                tickets_abiertos INTEGER,
-                tickets_resueltos INTEGER,
-                tiempo_promedio_resolucion REAL,
-                satisfaccion_promedio REAL,
-                tickets_por_categoria TEXT
+        # Creación y migración en una sola transacción (la conexión está en autocommit)
+        cursor.execute('BEGIN')
+        try:
+            # Tabla de tickets
+            cursor.execute(f'''
+                CREATE TABLE IF NOT EXISTS tickets (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    ticket_id TEXT UNIQUE,
+                    fecha_creacion DATE,
+                    fecha_resolucion DATE,
+                    categoria TEXT,
+                    prioridad TEXT,
+                    estado TEXT,
+                    agente_asignado TEXT,
+                    tiempo_resolucion_horas REAL,
+                    canal TEXT,
+                    satisfaccion_cliente INTEGER,
+                    descripcion TEXT,
+                    es_resuelto {_ES_RESUELTO_DEF}
+                )
+            ''')
+            
+            # Bases anteriores: sin es_resuelto, o con una columna normal que se
+            # llenaba a mano y podía quedar desactualizada respecto de estado
+            columnas = {fila[1]: fila[6] for fila in cursor.execute('PRAGMA table_xinfo(tickets)')}
+            if columnas.get('es_resuelto') == 0:
+                if sqlite3.sqlite_version_info < (3, 35, 0):
+                    raise RuntimeError(
+                        "Migrar es_resuelto requiere SQLite 3.35 o superior (ALTER TABLE DROP COLUMN); "
+                        f"versión disponible: {sqlite3.sqlite_version}"
+                    )
+                cursor.execute('DROP INDEX IF EXISTS idx_agt_resuelto')
+                cursor.execute('ALTER TABLE tickets DROP COLUMN es_resuelto')
+            if 'es_resuelto' not in columnas or columnas['es_resuelto'] == 0:
+                cursor.execute(f'ALTER TABLE tickets ADD COLUMN es_resuelto {_ES_RESUELTO_DEF}')
+            
+            # Tabla de métricas diarias
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS metricas_diarias (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    fecha DATE,
+                    tickets_abiertos INTEGER,
+                    tickets_resueltos INTEGER,
+                    tiempo_promedio_resolucion REAL,
+                    satisfaccion_promedio REAL,
+                    tickets_por_categoria TEXT
+                )
+            ''')
+            
+            # Metadatos de la base; db_token identifica esta base (cambia si se recrea)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS metadatos (
+                    clave TEXT PRIMARY KEY,
+                    valor TEXT
+                )
+            ''')
+            cursor.execute(
+                "INSERT OR IGNORE INTO metadatos (clave, valor) VALUES ('db_token', ?)",
+                (secrets.token_hex(16),)
             )
-        ''')
+            
+            # Índices para los GROUP BY de generate_sql_report
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_cat_est ON tickets(categoria, estado)')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_agt_resuelto ON tickets(agente_asignado)
+                WHERE es_resuelto = 1
+            ''')
+            # La tendencia semanal agrupa por la expresión, no por la columna
+            cursor.execute('DROP INDEX IF EXISTS idx_fecha')
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_semana ON tickets(strftime('%Y-%W', fecha_creacion))")
+            cursor.execute('COMMIT')
+        except Exception:
+            cursor.execute('ROLLBACK')
+            raise
         
-        self.conn.commit()
         logger.info("Tablas creadas exitosamente")
     
     def insert_sample_tickets(self, n_tickets=200):
         """Inserta tickets de ejemplo para análisis"""
         logger.info(f"Generando {n_tickets} tickets de ejemplo...")
         
-        np.random.seed(42)
+        # Import diferido: numpy solo se necesita para generar datos de ejemplo
+        import numpy as np
+        
+        rng = np.random.default_rng(42)
         cursor = self.conn.cursor()
         
         categorias = ['Hardware', 'Software', 'Red', 'Acceso', 'Email', 'Impresora']
         prioridades = ['Baja', 'Media', 'Alta', 'Crítica']
-        estados = ['Abierto', 'En Progreso', 'Resuelto', 'Cerrado']
         canales = ['Email', 'Teléfono', 'Chat', 'Portal', 'Slack']
         agentes = ['Agente1', 'Agente2', 'Agente3', 'Agente4']
         
-        base_date = datetime.now() - timedelta(days=60)
-        
-        for i in range(n_tickets):
-            fecha_creacion = base_date + timedelta(days=np.random.randint(0, 60))
-            tiempo_resolucion = np.random.exponential(24)  # Horas
-            
-            # Tickets resueltos tienen fecha de resolución
-            if np.random.random() > 0.2:  # 80% resueltos
-                fecha_resolucion = fecha_creacion + timedelta(hours=tiempo_resolucion)
-                estado = np.random.choice(['Resuelto', 'Cerrado'], p=[0.7, 0.3])
-            else:
-                fecha_resolucion = None
-                estado = np.random.choice(['Abierto', 'En Progreso'], p=[0.3, 0.7])
-            
-            satisfaccion = np.random.randint(1, 6) if fecha_resolucion else None
-            
-            cursor.execute('''
-                INSERT OR IGNORE INTO tickets 
-                (ticket_id, fecha_creacion, fecha_resolucion, categoria, prioridad, 
-                 estado, agente_asignado, tiempo_resolucion_horas, canal, 
-                 satisfaccion_cliente, descripcion)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                f'TICK-{i+1:04d}',
-                fecha_creacion.strftime('%Y-%m-%d'),
-                fecha_resolucion.strftime('%Y-%m-%d') if fecha_resolucion else None,
-                np.random.choice(categorias),
-                np.random.choice(prioridades, p=[0.3, 0.4, 0.2, 0.1]),
+        base_date = np.datetime64(datetime.now() - timedelta(days=60), 's')
+        
+        # Generar todas las columnas aleatorias de una sola vez
+        fechas = base_date + rng.integers(0, 60, n_tickets).astype('timedelta64[D]')
+        tiempos = rng.exponential(24, n_tickets)  # Horas
+        resueltos_mask = rng.random(n_tickets) > 0.2  # 80% resueltos
+        estados_resueltos = rng.choice(['Resuelto', 'Cerrado'], n_tickets, p=[0.7, 0.3])
+        estados_abiertos = rng.choice(['Abierto', 'En Progreso'], n_tickets, p=[0.3, 0.7])
+        estados = np.where(resueltos_mask, estados_resueltos, estados_abiertos)
+        satisfacciones = rng.integers(1, 6, n_tickets)
+        cats = rng.choice(categorias, n_tickets)
+        pris = rng.choice(prioridades, n_tickets, p=[0.3, 0.4, 0.2, 0.1])
+        agts = rng.choice(agentes, n_tickets)
+        cans = rng.choice(canales, n_tickets)
+        
+        # Tickets resueltos tienen fecha de resolución
+        fechas_resolucion = fechas + (tiempos * 3600).astype('timedelta64[s]')
+        fechas_creacion_str = np.datetime_as_string(fechas, unit='D').tolist()
+        fechas_resolucion_str = np.datetime_as_string(fechas_resolucion, unit='D').tolist()
+        
+        ticket_ids = [f'TICK-{i:04d}' for i in range(1, n_tickets + 1)]
+        descripciones = [f"Ticket de ejemplo {i}" for i in range(1, n_tickets + 1)]
+        
+        rows = [
+            (
+                ticket_id,
+                fecha_creacion,
+                fecha_resolucion if resuelto else None,
+                cat,
+                pri,
                 estado,
-                np.random.choice(agentes),
-                tiempo_resolucion if fecha_resolucion else None,
-                np.random.choice(canales),
-                satisfaccion,
-                f"Ticket de ejemplo {i+1}"
-            ))
-        
-        self.conn.commit()
+                agt,
+                tiempo if resuelto else None,
+                can,
+                satisfaccion if resuelto else None,
+                descripcion
+            )
+            for (ticket_id, descripcion, fecha_creacion, fecha_resolucion, resuelto,
+                 cat, pri, estado, agt, tiempo, can, satisfaccion) in zip(
+                ticket_ids, descripciones, fechas_creacion_str, fechas_resolucion_str,
+                resueltos_mask.tolist(), cats.tolist(), pris.tolist(), estados.tolist(),
+                agts.tolist(), tiempos.tolist(), cans.tolist(), satisfacciones.tolist()
+            )
+        ]
+        
+        cursor.execute('BEGIN')
+        try:
+            for inicio in range(0, len(rows), INSERT_BATCH_SIZE):
+                cursor.executemany('''
+                    INSERT OR IGNORE INTO tickets 
+                    (ticket_id, fecha_creacion, fecha_resolucion, categoria, prioridad, 
+                     estado, agente_asignado, tiempo_resolucion_horas, canal, 
+                     satisfaccion_cliente, descripcion)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', rows[inicio:inicio + INSERT_BATCH_SIZE])
+            cursor.execute('COMMIT')
+        except Exception:
+            cursor.execute('ROLLBACK')
+            raise
+        
         logger.info(f"{n_tickets} tickets insertados")
     
     def calculate_metrics(self):
         """Calcula métricas de soporte"""
         logger.info("Calculando métricas de soporte...")
         
-        # Leer datos desde SQL
-        df = pd.read_sql_query('''
+        cursor = self.conn.cursor()
+        
+        # Métricas generales agregadas directamente en SQL
+        cursor.execute('''
             SELECT 
-                fecha_creacion,
-                fecha_resolucion,
-                categoria,
-                prioridad,
-                estado,
-                tiempo_resolucion_horas,
-                satisfaccion_cliente,
-                canal
+                COUNT(*),
+                TOTAL(es_resuelto),
+                AVG(tiempo_resolucion_horas),
+                AVG(satisfaccion_cliente),
+                TOTAL(tiempo_resolucion_horas <= 24),
+                COUNT(tiempo_resolucion_horas)
             FROM tickets
-        ''', self.conn)
-        
-        df['fecha_creacion'] = pd.to_datetime(df['fecha_creacion'])
-        if 'fecha_resolucion' in df.columns:
-            df['fecha_resolucion'] = pd.to_datetime(df['fecha_resolucion'])
+        ''')
+        (total_tickets, tickets_resueltos, tiempo_promedio,
+         satisfaccion_promedio, resueltos_24h, total_resueltos) = cursor.fetchone()
         
-        # Métricas generales
-        total_tickets = len(df)
-        tickets_resueltos = len(df[df['estado'].isin(['Resuelto', 'Cerrado'])])
+        tickets_resueltos = int(tickets_resueltos)
         tickets_abiertos = total_tickets - tickets_resueltos
         tasa_resolucion = (tickets_resueltos / total_tickets * 100) if total_tickets > 0 else 0
         
-        # Tiempo promedio de resolución
-        tiempos_resueltos = df[df['tiempo_resolucion_horas'].notna()]['tiempo_resolucion_horas']
-        tiempo_promedio = tiempos_resueltos.mean() if len(tiempos_resueltos) > 0 else 0
-        
-        # Satisfacción promedio
-        satisfacciones = df[df['satisfaccion_cliente'].notna()]['satisfaccion_cliente']
-        satisfaccion_promedio = satisfacciones.mean() if len(satisfacciones) > 0 else 0
+        # Tiempo promedio de resolución y satisfacción (AVG ignora NULL)
+        tiempo_promedio = tiempo_promedio or 0
+        satisfaccion_promedio = satisfaccion_promedio or 0
         
-        # Tickets por categoría
-        tickets_por_categoria = df['categoria'].value_counts().to_dict()
-        
-        # Tickets por prioridad
-        tickets_por_prioridad = df['prioridad'].value_counts().to_dict()
-        
-        # Tickets por canal
-        tickets_por_canal = df['canal'].value_counts().to_dict()
+        # Distribución de tickets por categoría, prioridad y canal
+        distribuciones = {}
+        for columna in ('categoria', 'prioridad', 'canal'):
+            cursor.execute(f'''
+                SELECT {columna}, COUNT(*) FROM tickets
+                GROUP BY {columna} ORDER BY COUNT(*) DESC
+            ''')
+            distribuciones[columna] = dict(cursor.fetchall())
         
         # SLA (tickets resueltos en menos de 24 horas)
-        sla_24h = len(tiempos_resueltos[tiempos_resueltos <= 24]) / len(tiempos_resueltos) * 100 if len(tiempos_resueltos) > 0 else 0
+        sla_24h = resueltos_24h / total_resueltos * 100 if total_resueltos > 0 else 0
         
         self.metrics = {
             'total_tickets': total_tickets,
@@ -184,22 +282,36 @@ class SupportAnalyzer:
             'tiempo_promedio_resolucion_horas': round(tiempo_promedio, 2),
             'satisfaccion_promedio': round(satisfaccion_promedio, 2),
             'sla_24h': round(sla_24h, 2),
-            'tickets_por_categoria': tickets_por_categoria,
-            'tickets_por_prioridad': tickets_por_prioridad,
-            'tickets_por_canal': tickets_por_canal
+            'tickets_por_categoria': distribuciones['categoria'],
+            'tickets_por_prioridad': distribuciones['prioridad'],
+            'tickets_por_canal': distribuciones['canal']
         }
         
         logger.info("Métricas calculadas exitosamente")
         return self.metrics
     
+    def _can_read_in_parallel(self):
+        """Indica si otras conexiones pueden ver los mismos datos que self.conn"""
+        if self.conn.in_transaction:
+            return False  # Escrituras sin confirmar solo visibles en self.conn
+        archivo = self.conn.execute('PRAGMA database_list').fetchone()[2]
+        return bool(archivo)  # Vacío para bases en memoria
+    
+    def _fetch_readonly(self, query):
+        """Ejecuta una consulta en una conexión de solo lectura propia"""
+        uri = Path(self.db_path).resolve().as_uri() + '?mode=ro'
+        conn = sqlite3.connect(uri, uri=True)
+        try:
+            return conn.execute(query).fetchall()
+        finally:
+            conn.close()
+    
     def generate_sql_report(self):
         """Genera reporte usando consultas SQL"""
         logger.info("Generando reporte SQL...")
         
-        cursor = self.conn.cursor()
-        
         # Consulta 1: Tickets por categoría y estado
-        cursor.execute('''
+        consulta_categoria = '''
             SELECT 
                 categoria,
                 estado,
@@ -208,38 +320,48 @@ class SupportAnalyzer:
             FROM tickets
             GROUP BY categoria, estado
             ORDER BY categoria, cantidad DESC
-        ''')
-        
-        reporte_categoria = cursor.fetchall()
+        '''
         
         # Consulta 2: Performance por agente
-        cursor.execute('''
+        consulta_agentes = '''
             SELECT 
                 agente_asignado,
                 COUNT(*) as total_tickets,
                 AVG(tiempo_resolucion_horas) as tiempo_promedio,
                 AVG(satisfaccion_cliente) as satisfaccion_promedio
             FROM tickets
-            WHERE estado IN ('Resuelto', 'Cerrado')
+            WHERE es_resuelto = 1
             GROUP BY agente_asignado
             ORDER BY total_tickets DESC
-        ''')
-        
-        reporte_agentes = cursor.fetchall()
+        '''
         
         # Consulta 3: Tendencia semanal
-        cursor.execute('''
+        consulta_semanal = '''
             SELECT 
                 strftime('%Y-%W', fecha_creacion) as semana,
                 COUNT(*) as tickets_creados,
-                COUNT(CASE WHEN estado IN ('Resuelto', 'Cerrado') THEN 1 END) as tickets_resueltos
+                SUM(es_resuelto) as tickets_resueltos
             FROM tickets
             GROUP BY semana
             ORDER BY semana DESC
             LIMIT 8
-        ''')
-        
-        reporte_semanal = cursor.fetchall()
+        '''
+        
+        if self._can_read_in_parallel():
+            # Las tres consultas son independientes: cada una corre en su propia conexión
+            with ThreadPoolExecutor(max_workers=3) as executor:
+                futuro_categoria = executor.submit(self._fetch_readonly, consulta_categoria)
+                futuro_agentes = executor.submit(self._fetch_readonly, consulta_agentes)
+                futuro_semanal = executor.submit(self._fetch_readonly, consulta_semanal)
+            
+            reporte_categoria = futuro_categoria.result()
+            reporte_agentes = futuro_agentes.result()
+            reporte_semanal = futuro_semanal.result()
+        else:
+            cursor = self.conn.cursor()
+            reporte_categoria = cursor.execute(consulta_categoria).fetchall()
+            reporte_agentes = cursor.execute(consulta_agentes).fetchall()
+            reporte_semanal = cursor.execute(consulta_semanal).fetchall()
         
         return {
             'por_categoria': reporte_categoria,
@@ -247,66 +369,141 @@ class SupportAnalyzer:
             'tendencia_semanal': reporte_semanal
         }
     
-    def export_for_powerbi(self, output_path='powerbi_support_data.json'):
-        """Exporta datos formateados para Power BI"""
-        logger.info("Exportando datos para Power BI...")
+    def export_for_powerbi(self, output_path='powerbi_support_data.ndjson',
+                           metrics_path='powerbi_support_metrics.json'):
+        """
+        Exporta datos formateados para Power BI.
+        
+        Los tickets se agregan a un archivo NDJSON (un ticket por línea) y solo se
+        escriben los creados desde la última exportación, registrada en el archivo
+        auxiliar ``<output_path>.last_id`` junto con el ``db_token`` de la base. Si la
+        base ya no coincide con ese registro (por ejemplo, porque se volvió a crear y
+        tiene otro ``db_token``) el NDJSON se reescribe completo. Las
+        métricas se reescriben completas en un JSON aparte.
         
-        # Leer datos completos
-        df = pd.read_sql_query('SELECT * FROM tickets', self.conn)
+        Limitación: un ticket ya exportado no se vuelve a escribir si después cambia
+        su estado u otro campo; el NDJSON conserva la versión de la primera exportación.
         
-        # Preparar datos para Power BI
-        powerbi_data = {
+        Args:
+            output_path: Ruta del archivo NDJSON de tickets
+            metrics_path: Ruta del archivo JSON de métricas
+        """
+        logger.info("Exportando datos para Power BI...")
+        
+        cursor = self.conn.cursor()
+        last_id_path = f'{output_path}.last_id'
+        
+        cursor.execute("SELECT valor FROM metadatos WHERE clave = 'db_token'")
+        db_token = cursor.fetchone()[0]
+        
+        # Estado de la última exportación: base exportada, id y ticket_id del
+        # último ticket escrito y tamaño del NDJSON en ese momento
+        estado_export = None
+        if os.path.exists(output_path) and os.path.exists(last_id_path):
+            try:
+                with open(last_id_path, 'rb') as f:
+                    estado_export = orjson.loads(f.read())
+                last_id = int(estado_export['last_id'])
+                size = int(estado_export['size'])
+            except (orjson.JSONDecodeError, KeyError, TypeError, ValueError):
+                logger.warning(f"Registro de exportación inválido: {last_id_path}")
+                estado_export = None
+        
+        if estado_export is not None and estado_export.get('db_token') != db_token:
+            logger.warning("El NDJSON proviene de otra base de datos; se reexportan todos los tickets")
+            estado_export = None
+        
+        if estado_export is not None:
+            # El último ticket exportado debe seguir existiendo con el mismo ticket_id;
+            # si no, se borraron o reemplazaron filas ya exportadas
+            cursor.execute('SELECT ticket_id FROM tickets WHERE id = ?', (last_id,))
+            fila = cursor.fetchone()
+            if last_id > 0 and (fila is None or fila[0] != estado_export.get('ticket_id')):
+                logger.warning("La base no coincide con la última exportación; se reexportan todos los tickets")
+                estado_export = None
+            elif size > os.path.getsize(output_path):
+                logger.warning(f"{output_path} es menor que lo registrado; se reexportan todos los tickets")
+                estado_export = None
+        
+        if estado_export is None:
+            last_id, last_ticket_id, size = 0, None, 0
+        else:
+            last_ticket_id = estado_export.get('ticket_id')
+        
+        # Resumen calculado por SQLite antes de recorrer las filas
+        cursor.execute('SELECT COUNT(*), MIN(fecha_creacion), MAX(fecha_creacion) FROM tickets')
+        total_tickets, fecha_inicio, fecha_fin = cursor.fetchone()
+        
+        # Solo tickets nuevos desde la última exportación
+        cursor.execute('SELECT * FROM tickets WHERE id > ? ORDER BY id', (last_id,))
+        cols = [d[0] for d in cursor.description]
+        id_idx = cols.index('id')
+        ticket_id_idx = cols.index('ticket_id')
+        
+        nuevos = 0
+        with open(output_path, 'ab' if size else 'wb') as f:
+            # Descarta líneas escritas después del último registro (p. ej. tras un fallo)
+            f.truncate(size)
+            f.seek(size)
+            for row in cursor:
+                f.write(orjson.dumps(dict(zip(cols, row))) + b'\n')
+                last_id = row[id_idx]
+                last_ticket_id = row[ticket_id_idx]
+                nuevos += 1
+            f.flush()
+            size = f.tell()
+        
+        # Reemplazo atómico del registro para no dejarlo a medio escribir
+        tmp_path = f'{last_id_path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(orjson.dumps({
+                'db_token': db_token,
+                'last_id': last_id,
+                'ticket_id': last_ticket_id,
+                'size': size
+            }))
+        os.replace(tmp_path, last_id_path)
+        
+        # Métricas y resumen, reescritos en cada exportación
+        powerbi_metrics = {
             'timestamp': datetime.now().isoformat(),
             'metrics': self.metrics,
-            'tickets': df.to_dict('records'),
             'summary': {
-                'total_tickets': len(df),
+                'total_tickets': total_tickets,
                 'date_range': {
-                    'start': df['fecha_creacion'].min() if 'fecha_creacion' in df.columns else None,
-                    'end': df['fecha_creacion'].max() if 'fecha_creacion' in df.columns else None
+                    'start': fecha_inicio,
+                    'end': fecha_fin
                 }
             }
         }
         
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(powerbi_data, f, indent=2, ensure_ascii=False, default=str)
+        with open(metrics_path, 'wb') as f:
+            f.write(orjson.dumps(powerbi_metrics, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
         
+        logger.info(f"{nuevos} tickets nuevos exportados")
+        logger.info(f"Métricas exportadas a: {metrics_path}")
         logger.info(f"Datos exportados a: {output_path}")
         return output_path
     
     def get_summary_report(self):
         """Genera reporte resumen"""
-        report = "\n" + "=" * 60
-        report += "\nREPORTE DE MÉTRICAS DE SOPORTE TI"
-        report += "\n" + "=" * 60
-        
         if not self.metrics:
-            return report + "\nNo hay métricas calculadas. Ejecuta calculate_metrics() primero."
-        
-        report += f"\n\nMETRICAS GENERALES"
-        report += f"\n  Total de tickets: {self.metrics['total_tickets']}"
-        report += f"\n  Tickets resueltos: {self.metrics['tickets_resueltos']}"
-        report += f"\n  Tickets abiertos: {self.metrics['tickets_abiertos']}"
-        report += f"\n  Tasa de resolucion: {self.metrics['tasa_resolucion']}%"
-        
-        report += f"\n\nTIEMPOS DE RESOLUCION"
-        report += f"\n  Tiempo promedio: {self.metrics['tiempo_promedio_resolucion_horas']:.2f} horas"
-        report += f"\n  SLA 24h: {self.metrics['sla_24h']:.2f}%"
+            return _REPORT_HEADER + "\nNo hay métricas calculadas. Ejecuta calculate_metrics() primero."
         
-        report += f"\n\nSATISFACCION"
-        report += f"\n  Satisfaccion promedio: {self.metrics['satisfaccion_promedio']:.2f}/5"
+        m = self.metrics
+        parts = [_REPORT_TEMPLATE.format_map(m)]
         
-        report += f"\n\nTICKETS POR CATEGORIA"
-        for categoria, cantidad in self.metrics['tickets_por_categoria'].items():
-            report += f"\n  {categoria}: {cantidad}"
+        parts.append("\nTICKETS POR CATEGORIA")
+        for categoria, cantidad in m['tickets_por_categoria'].items():
+            parts.append(f"  {categoria}: {cantidad}")
         
-        report += f"\n\nTICKETS POR CANAL"
-        for canal, cantidad in self.metrics['tickets_por_canal'].items():
-            report += f"\n  {canal}: {cantidad}"
+        parts.append("\nTICKETS POR CANAL")
+        for canal, cantidad in m['tickets_por_canal'].items():
+            parts.append(f"  {canal}: {cantidad}")
         
-        report += "\n" + "=" * 60
+        parts.append(_SEP)
         
-        return report
+        return "\n".join(parts)
     
     def close(self):
         """Cierra la conexión a la base de datos"""